@@ -4,247 +4,514 @@
 Overview:
     Iterate through each attached volume and encrypt it for EC2.
 Params:
-    ID for EC2 instance
+    ID for EC2 instance, or a list of IDs to encrypt in parallel
     Customer Master Key (CMK) (optional)
     Profile to use
+    Region (optional, defaults to the profile's region)
 Conditions:
-    Return if volume already encrypted
+    Skip volumes already encrypted (re-key if encrypted with another CMK)
+    Return without stopping the instance if no volume needs encrypting
     Use named profiles from credentials file
 """
 
+import os
 import sys
-import boto3
+import time
+import threading
 import botocore
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
+# Serializes progress lines from parallel instance and volume workers
+_print_lock = threading.Lock()
 
-def main(argv):
-    parser = argparse.ArgumentParser(description='Encrypts EC2 root volume.')
-    parser.add_argument('-i', '--instance',
-                        help='Instance to encrypt volume on.', required=True)
-    parser.add_argument('-key', '--customer_master_key',
-                        help='Customer master key', required=False)
-    parser.add_argument('-p', '--profile',
-                        help='Profile to use', required=False)
-    parser.add_argument('-r', '--region',
-                        help='Region of source volume', required=True)
-    args = parser.parse_args()
 
-    """ Set up AWS Session + Client + Resources + Waiters """
-    if args.profile:
-        # Create custom session
-        print('Using profile {}'.format(args.profile))
-        session = boto3.session.Session(profile_name=args.profile)
-    else:
-        # Use default session
-        session = boto3.session.Session()
+@lru_cache(maxsize=None)
+def _get_client(profile=None, region=None, service='ec2'):
+    """ Build a client once per profile and reuse it in-process """
+    # Imported here so argument errors and --help never pay for loading boto3
+    import boto3
+    from botocore.config import Config
 
-    # Get CMK
-    customer_master_key = args.customer_master_key
+    session = boto3.session.Session(profile_name=profile, region_name=region)
+    return session.client(
+        service,
+        config=Config(
+            retries={
+                'max_attempts': 10,
+                'mode': 'adaptive',
+            },
+            max_pool_connections=32,
+            tcp_keepalive=True,
+        ),
+    )
 
-    client = session.client('ec2')
-    ec2 = session.resource('ec2')
 
-    waiter_instance_exists = client.get_waiter('instance_exists')
-    waiter_instance_stopped = client.get_waiter('instance_stopped')
-    waiter_instance_running = client.get_waiter('instance_running')
-    waiter_snapshot_complete = client.get_waiter('snapshot_completed')
-    waiter_volume_available = client.get_waiter('volume_available')
+def report(instance_id, message):
+    """ Print a progress line tagged with the instance it belongs to """
+    with _print_lock:
+        print('[{}] {}'.format(instance_id, message))
 
-    """ Check instance exists """
-    instance_id = args.instance
-    print('---Checking instance ({})'.format(instance_id))
-    instance = ec2.Instance(instance_id)
 
+def wait(waiter, delay, max_attempts, **kwargs):
+    """ Block on a waiter with an explicit poll interval and attempt budget """
+    waiter.wait(
+        WaiterConfig={
+            'Delay': delay,
+            'MaxAttempts': max_attempts,
+        },
+        **kwargs
+    )
+
+
+def backoff(delay=2, factor=1.5, max_delay=15, timeout=3600):
+    """ Yield poll intervals growing from delay to max_delay until timeout """
+    elapsed = 0
+    while elapsed < timeout:
+        yield delay
+        elapsed += delay
+        delay = min(delay * factor, max_delay)
+
+
+def wait_snapshots(client, snapshot_ids, timeout=3600):
+    """ Poll snapshots in a single describe stream until all are completed
+
+    Snapshots that DescribeSnapshots does not know about yet, which is
+    normal right after they are created, are polled again on the next tick.
+    """
+    pending = list(snapshot_ids)
+    response = {}
+    for delay in backoff(timeout=timeout):
+        try:
+            response = client.describe_snapshots(SnapshotIds=pending)
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidSnapshot.NotFound':
+                raise
+            time.sleep(delay)
+            continue
+
+        for snapshot in response['Snapshots']:
+            if snapshot['State'] == 'error':
+                raise botocore.exceptions.WaiterError(
+                    name='SnapshotCompleted',
+                    reason='Snapshot {} failed at {}'.format(
+                        snapshot['SnapshotId'], snapshot.get('Progress')),
+                    last_response=response,
+                )
+            if snapshot['State'] == 'completed':
+                pending.remove(snapshot['SnapshotId'])
+
+        if not pending:
+            return
+        time.sleep(delay)
+
+    raise botocore.exceptions.WaiterError(
+        name='SnapshotCompleted',
+        reason='Max wait time exceeded',
+        last_response=response,
+    )
+
+
+def delete_concurrently(client, instance_id, snapshot_ids=(), volume_ids=()):
+    """ Delete independent snapshots and volumes in parallel
+
+    Every deletion is attempted; a failure is reported without masking the
+    others.
+    """
+    deletions = [
+        (client.delete_snapshot, {'SnapshotId': snapshot_id})
+        for snapshot_id in snapshot_ids
+    ] + [
+        (client.delete_volume, {'VolumeId': volume_id})
+        for volume_id in volume_ids
+    ]
+
+    with ThreadPoolExecutor(max_workers=min(16, len(deletions))) as executor:
+        futures = [
+            (kwargs, executor.submit(delete, **kwargs))
+            for delete, kwargs in deletions
+        ]
+
+    for kwargs, future in futures:
+        try:
+            future.result()
+        except botocore.exceptions.ClientError as e:
+            resource_id = list(kwargs.values())[0]
+            report(instance_id, 'ERROR: Could not remove {}: {}'
+                   .format(resource_id, e))
+
+
+def resolve_key_arn(kms_client, customer_master_key):
+    """ Resolve a CMK id, key ARN, alias name or alias ARN to its key ARN """
     try:
-        waiter_instance_exists.wait(
+        return kms_client.describe_key(
+            KeyId=customer_master_key
+        )['KeyMetadata']['Arn']
+    except botocore.exceptions.ClientError as e:
+        sys.exit('ERROR: {}'.format(e))
+
+
+def wait_instance_state(client, instance_id, state_name, timeout=1200):
+    """ Poll the instance with backoff until it reaches state_name """
+    response = {}
+    for delay in backoff(timeout=timeout):
+        response = client.describe_instances(
+            InstanceIds=[
+                instance_id,
+            ]
+        )
+        state = response['Reservations'][0]['Instances'][0]['State']['Name']
+        if state == state_name:
+            return
+        if state in ('shutting-down', 'terminated'):
+            break
+        time.sleep(delay)
+
+    raise botocore.exceptions.WaiterError(
+        name='Instance{}'.format(state_name.capitalize()),
+        reason='Instance did not reach {}'.format(state_name),
+        last_response=response,
+    )
+
+
+def stop_instance(client, instance_id, state_code):
+    """ Stop the instance if it is running and wait until it is stopped """
+    # Nothing to do if the instance is already stopped
+    if state_code == 80:
+        return
+
+    # Validate successful shutdown if it is running or stopping
+    if state_code == 16:
+        client.stop_instances(
             InstanceIds=[
                 instance_id,
             ]
         )
+
+    try:
+        wait_instance_state(client, instance_id, 'stopped')
     except botocore.exceptions.WaiterError as e:
         sys.exit('ERROR: {}'.format(e))
-    
-    all_mappings = []    
-    
-    block_device_mappings = instance.block_device_mappings
 
-    for device_mapping in block_device_mappings:
-        original_mappings = {
-            'DeleteOnTermination': device_mapping['Ebs']['DeleteOnTermination'],
-            'VolumeId': device_mapping['Ebs']['VolumeId'],
-            'DeviceName': device_mapping['DeviceName'],
-        }
-        all_mappings.append(original_mappings)
-  
-    volume_data = []
-    
-    print('---Preparing instance')    
-    """ Get volume and exit if already encrypted """
-    volumes = [v for v in instance.volumes.all()]
-    for volume in volumes:
-        volume_encrypted = volume.encrypted
-        
-        current_volume_data = {}
-        for mapping in all_mappings:
-            if mapping['VolumeId'] == volume.volume_id:
-                current_volume_data = {
-                    'volume': volume,
-                    'DeleteOnTermination': mapping['DeleteOnTermination'],
-                    'DeviceName': mapping['DeviceName'],
-                }        
-                 
-        if volume_encrypted:
-            sys.exit(
-                '**Volume ({}) is already encrypted'
-                .format(volume.id))
 
-        """ Step 1: Prepare instance """
-    
-        # Exit if instance is pending, shutting-down, or terminated
-        instance_exit_states = [0, 32, 48]
-        if instance.state['Code'] in instance_exit_states:
-            sys.exit(
-                'ERROR: Instance is {} please make sure this instance is active.'
-                .format(instance.state['Name'])
-            )
-    
-        # Validate successful shutdown if it is running or stopping
-        if instance.state['Code'] is 16:
-            instance.stop()
-    
-        # Set the max_attempts for this waiter (default 40)
-        waiter_instance_stopped.config.max_attempts = 80
-    
-        try:
-            waiter_instance_stopped.wait(
-                InstanceIds=[
-                    instance_id,
-                ]
-            )
-        except botocore.exceptions.WaiterError as e:
-            sys.exit('ERROR: {}'.format(e))
-    
-        """ Step 2: Take snapshot of volume """
-        print('---Create snapshot of volume ({})'.format(volume.id))
-        snapshot = ec2.create_snapshot(
-            VolumeId=volume.id,
-            Description='Snapshot of volume ({})'.format(volume.id),
+def start_snapshots(client, instance_description, volume_jobs):
+    """ Snapshot the volumes of volume_jobs with one CreateSnapshots call
+
+    Only the volumes of one call share a point in time, so callers that
+    need a crash-consistent set must pass every volume at once; the
+    replacement snapshots are taken that way, after the instance stops.
+    Returns the ids in volume_jobs order without waiting for completion.
+    """
+    instance_id = instance_description['InstanceId']
+    root_device = instance_description['RootDeviceName']
+
+    volume_ids = set()
+    for volume, _, _ in volume_jobs:
+        report(instance_id, '---Create snapshot of volume ({})'
+               .format(volume['VolumeId']))
+        volume_ids.add(volume['VolumeId'])
+
+    # Only snapshot the volumes in this batch
+    instance_specification = {
+        'InstanceId': instance_id,
+        'ExcludeBootVolume': not any(
+            current_volume_data['DeviceName'] == root_device
+            for _, current_volume_data, _ in volume_jobs),
+    }
+    excluded_volume_ids = [
+        device_mapping['Ebs']['VolumeId']
+        for device_mapping in instance_description['BlockDeviceMappings']
+        if device_mapping['DeviceName'] != root_device and
+        device_mapping['Ebs']['VolumeId'] not in volume_ids
+    ]
+    if excluded_volume_ids:
+        instance_specification['ExcludeDataVolumeIds'] = excluded_volume_ids
+
+    snapshots = client.create_snapshots(
+        InstanceSpecification=instance_specification,
+        Description='Snapshot of instance ({}) volumes'.format(instance_id),
+    )['Snapshots']
+    snapshot_ids = {
+        snapshot['VolumeId']: snapshot['SnapshotId'] for snapshot in snapshots
+    }
+
+    return [snapshot_ids[volume['VolumeId']] for volume, _, _ in volume_jobs]
+
+
+def detach_volume(client, instance_id, volume_id, device):
+    """ Detach a volume and wait until it has released the device """
+    client.detach_volume(
+        VolumeId=volume_id,
+        InstanceId=instance_id,
+        Device=device
+    )
+    wait(
+        client.get_waiter('volume_available'), 2, 150,
+        VolumeIds=[
+            volume_id,
+        ],
+    )
+
+
+def replace_volume(client, instance_description, volume, current_volume_data,
+                   customer_master_key=None):
+    """ Swap one attached volume for an encrypted copy of its snapshot
+
+    Runs steps 3-5 once current_volume_data['snapshot_id'] has completed
+    and the instance is stopped. Returns current_volume_data updated with
+    the encrypted volume id.
+    """
+    instance_id = instance_description['InstanceId']
+    availability_zone = instance_description['Placement']['AvailabilityZone']
+    volume_id = volume['VolumeId']
+    snapshot_id = current_volume_data['snapshot_id']
+
+    """ Step 3: Create encrypted volume """
+    report(instance_id, '---Create encrypted volume from snapshot ({}) '
+           'for volume ({})'.format(snapshot_id, volume_id))
+    # Mirror the original volume's size and performance settings
+    volume_options = {
+        'SnapshotId': snapshot_id,
+        'VolumeType': volume['VolumeType'],
+        'Size': volume['Size'],
+        'AvailabilityZone': availability_zone,
+        'Encrypted': True,
+    }
+    if volume['VolumeType'] in ('io1', 'io2', 'gp3'):
+        volume_options['Iops'] = volume['Iops']
+    if volume['VolumeType'] == 'gp3':
+        volume_options['Throughput'] = volume['Throughput']
+    if customer_master_key:
+        # Use custom key
+        volume_options['KmsKeyId'] = customer_master_key
+
+    volume_encrypted_id = client.create_volume(
+        **volume_options
+    )['VolumeId']
+
+    # Add original tags to new volume 
+    if volume.get('Tags'):
+        client.create_tags(
+            Resources=[
+                volume_encrypted_id,
+            ],
+            Tags=volume['Tags'],
         )
-        
-        waiter_snapshot_complete.config.max_attempts = 240
-    
-        try:
-            waiter_snapshot_complete.wait(
-                SnapshotIds=[
-                    snapshot.id,
-                ]
-            )
-        except botocore.exceptions.WaiterError as e:
-            snapshot.delete()
-            sys.exit('ERROR: {}'.format(e))
-    
-        """ Step 3: Create encrypted volume """
-        print('---Create encrypted copy of snapshot')
-        if customer_master_key:
-            # Use custom key
-            snapshot_encrypted_dict = snapshot.copy(
-                SourceRegion=args.region,
-                Description='Encrypted copy of snapshot #{}'
-                            .format(snapshot.id),
-                KmsKeyId=customer_master_key,
-                Encrypted=True,
-            )
-        else:
-            # Use default key
-            snapshot_encrypted_dict = snapshot.copy(
-                SourceRegion=args.region,
-                Description='Encrypted copy of snapshot ({})'
-                            .format(snapshot.id),
-                Encrypted=True,
-            )
-    
-        snapshot_encrypted = ec2.Snapshot(snapshot_encrypted_dict['SnapshotId'])
-    
-        try:
-            waiter_snapshot_complete.wait(
-                SnapshotIds=[
-                    snapshot_encrypted.id,
-                ],
-            )
-        except botocore.exceptions.WaiterError as e:
-            snapshot.delete()
-            snapshot_encrypted.delete()
-            sys.exit('ERROR: {}'.format(e))
-    
-        print('---Create encrypted volume from snapshot')
-
-        if volume.volume_type == 'io1':
-            volume_encrypted = ec2.create_volume(
-                SnapshotId=snapshot_encrypted.id,
-                VolumeType=volume.volume_type,
-                Iops=volume.iops,
-                AvailabilityZone=instance.placement['AvailabilityZone']
-            )
-        else:
-            volume_encrypted = ec2.create_volume(
-                SnapshotId=snapshot_encrypted.id,
-                VolumeType=volume.volume_type,
-                AvailabilityZone=instance.placement['AvailabilityZone']
-            )
-     
-        # Add original tags to new volume 
-        if volume.tags:
-            volume_encrypted.create_tags(Tags=volume.tags)
-    
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
         """ Step 4: Detach current volume """
-        print('---Detach volume {}'.format(volume.id))
-        instance.detach_volume(
-            VolumeId=volume.id,
-            Device=current_volume_data['DeviceName']
+        # Detach while the new volume is still being created
+        report(instance_id, '---Detach volume {}'.format(volume_id))
+        detached = executor.submit(
+            detach_volume, client, instance_id, volume_id,
+            current_volume_data['DeviceName'],
         )
-    
+
         """ Step 5: Attach new encrypted volume """
-        print('---Attach volume {}'.format(volume_encrypted.id))
+        report(instance_id, '---Attach volume {} in place of {}'
+               .format(volume_encrypted_id, volume_id))
         try:
-            waiter_volume_available.wait(
+            wait(
+                client.get_waiter('volume_available'), 2, 150,
                 VolumeIds=[
-                    volume_encrypted.id,
+                    volume_encrypted_id,
                 ],
             )
+            detached.result()
         except botocore.exceptions.WaiterError as e:
-            snapshot.delete()
-            snapshot_encrypted.delete()
-            volume_encrypted.delete()
+            client.delete_snapshot(SnapshotId=snapshot_id)
+            client.delete_volume(VolumeId=volume_encrypted_id)
+            # The original volume is no longer attached; say where it goes
+            report(instance_id, '**Original volume ({}) was detached from {}, '
+                   'reattach it before restarting the instance'
+                   .format(volume_id, current_volume_data['DeviceName']))
+            sys.exit('ERROR: {}'.format(e))
+        except botocore.exceptions.ClientError as e:
+            # The detach was refused, so the original volume may still be
+            # attached; only the encrypted copy needs removing
+            client.delete_snapshot(SnapshotId=snapshot_id)
+            client.delete_volume(VolumeId=volume_encrypted_id)
             sys.exit('ERROR: {}'.format(e))
+
+    client.attach_volume(
+        VolumeId=volume_encrypted_id,
+        InstanceId=instance_id,
+        Device=current_volume_data['DeviceName']
+    )
+
+    current_volume_data['volume_encrypted_id'] = volume_encrypted_id
+    return current_volume_data
+
+
+def encrypt_instance(client, instance_id, customer_master_key=None):
+    """ Encrypt every volume attached to a single instance
+
+    customer_master_key must be a key ARN (see resolve_key_arn) so it can
+    be compared with the KmsKeyId of already encrypted volumes.
+
+    Returns a dict mapping each original volume id to the id of the
+    encrypted volume that replaced it.
+    """
+    waiter_instance_running = client.get_waiter('instance_running')
+
+    """ Check instance exists """
+    report(instance_id, '---Checking instance')
+
+    # Describe the instance once and read every attribute from the response
+    try:
+        reservations = client.describe_instances(
+            InstanceIds=[
+                instance_id,
+            ]
+        )['Reservations']
+    except botocore.exceptions.ClientError as e:
+        sys.exit('ERROR: {}'.format(e))
+    if not reservations:
+        sys.exit('ERROR: Instance ({}) not found'.format(instance_id))
+
+    instance_description = reservations[0]['Instances'][0]
+    block_device_mappings = instance_description['BlockDeviceMappings']
+
+    # Original mappings to persist to the new volumes, keyed by volume id
+    mappings_by_volume = {
+        device_mapping['Ebs']['VolumeId']: {
+            'DeleteOnTermination': device_mapping['Ebs']['DeleteOnTermination'],
+            'DeviceName': device_mapping['DeviceName'],
+        }
+        for device_mapping in block_device_mappings
+    }
+
+    volume_jobs = []
     
-        instance.attach_volume(
-            VolumeId=volume_encrypted.id,
-            Device=current_volume_data['DeviceName']
-        )
+    report(instance_id, '---Preparing instance')
+    """ Get volumes and skip those already encrypted """
+    volumes = client.describe_volumes(
+        VolumeIds=list(mappings_by_volume)
+    )['Volumes']
+    for volume in volumes:
+        volume_id = volume['VolumeId']
+        volume_encrypted = volume['Encrypted']
         
-        current_volume_data['snapshot'] = snapshot
-        current_volume_data['snapshot_encrypted'] = snapshot_encrypted
-        volume_data.append(current_volume_data)                  
-    
-    for bdm in volume_data:
+        mapping = mappings_by_volume[volume_id]
+        current_volume_data = {
+            'volume_id': volume_id,
+            'DeleteOnTermination': mapping['DeleteOnTermination'],
+            'DeviceName': mapping['DeviceName'],
+        }
+
+        # Volumes already encrypted under another CMK are re-keyed
+        rekey = False
+        if volume_encrypted:
+            if (not customer_master_key or
+                    volume['KmsKeyId'] == customer_master_key):
+                report(instance_id, '**Volume ({}) is already encrypted, '
+                       'skipping'.format(volume_id))
+                continue
+            report(instance_id, '---Volume ({}) is encrypted with another '
+                   'key, re-keying'.format(volume_id))
+            rekey = True
+
+        volume_jobs.append((volume, current_volume_data, rekey))
+
+    # Leave the instance untouched if there is nothing to encrypt
+    if not volume_jobs:
+        report(instance_id, '**All volumes are already encrypted')
+        return {}
+
+    instance_state_code = instance_description['State']['Code']
+    instance_state_name = instance_description['State']['Name']
+
+    """ Step 1: Prepare instance """
+
+    # Exit if instance is pending, shutting-down, or terminated
+    instance_exit_states = (0, 32, 48)
+    if instance_state_code in instance_exit_states:
+        sys.exit(
+            'ERROR: Instance is {} please make sure this instance is active.'
+            .format(instance_state_name)
+        )
+
+    """ Step 2: Take snapshots of volumes """
+    # Warm up re-keyed volumes with a live snapshot while the instance still
+    # runs. It is never used to build a volume, since writes continue after
+    # it; it only makes the snapshot taken after the stop incremental.
+    warmup_snapshot_ids = []
+    rekey_jobs = [
+        (volume, current_volume_data, rekey)
+        for volume, current_volume_data, rekey in volume_jobs if rekey
+    ]
+    if rekey_jobs:
+        warmup_snapshot_ids = start_snapshots(
+            client, instance_description, rekey_jobs)
+        try:
+            wait_snapshots(client, warmup_snapshot_ids)
+        except botocore.exceptions.WaiterError as e:
+            for snapshot_id in warmup_snapshot_ids:
+                client.delete_snapshot(SnapshotId=snapshot_id)
+            sys.exit('ERROR: {}'.format(e))
+
+    # Every replacement volume is built from a snapshot of the stopped
+    # instance, so no write is lost
+    stop_instance(client, instance_id, instance_state_code)
+    snapshot_ids = start_snapshots(client, instance_description, volume_jobs)
+    for (_, current_volume_data, _), snapshot_id in zip(
+            volume_jobs, snapshot_ids):
+        current_volume_data['snapshot_id'] = snapshot_id
+
+    # Poll all of them in one DescribeSnapshots stream
+    try:
+        wait_snapshots(client, snapshot_ids)
+    except botocore.exceptions.WaiterError as e:
+        for snapshot_id in snapshot_ids + warmup_snapshot_ids:
+            client.delete_snapshot(SnapshotId=snapshot_id)
+        sys.exit('ERROR: {}'.format(e))
+
+    # Create and swap in each encrypted volume in parallel
+    with ThreadPoolExecutor(max_workers=min(8, len(volume_jobs))) as executor:
+        futures = [
+            executor.submit(
+                replace_volume, client, instance_description,
+                volume, current_volume_data, customer_master_key,
+            )
+            for volume, current_volume_data, _ in volume_jobs
+        ]
+    try:
+        volume_data = [future.result() for future in futures]
+    except (SystemExit, botocore.exceptions.ClientError):
+        # replace_volume cleans up after itself, but not the warm-ups
+        for snapshot_id in warmup_snapshot_ids:
+            client.delete_snapshot(SnapshotId=snapshot_id)
+        raise
+
+    # Attached volumes default to DeleteOnTermination=False, so only
+    # mappings that had it enabled need to be restored
+    restored_mappings = [
+        {
+            'DeviceName': bdm['DeviceName'],
+            'Ebs': {
+                'DeleteOnTermination': bdm['DeleteOnTermination'],
+            },
+        }
+        for bdm in volume_data if bdm['DeleteOnTermination']
+    ]
+    if restored_mappings:
         # Modify instance attributes
-        instance.modify_attribute(
-            BlockDeviceMappings=[
-                {
-                    'DeviceName': bdm['DeviceName'],
-                    'Ebs': {
-                        'DeleteOnTermination':
-                        bdm['DeleteOnTermination'],
-                    },
-                },
-            ],
+        client.modify_instance_attribute(
+            InstanceId=instance_id,
+            BlockDeviceMappings=restored_mappings,
         )
+
     """ Step 6: Start instance """
-    print('---Start instance')
-    instance.start()
+    report(instance_id, '---Start instance')
+    client.start_instances(
+        InstanceIds=[
+            instance_id,
+        ]
+    )
     try:
-        waiter_instance_running.wait(
+        wait(
+            waiter_instance_running, 5, 120,
             InstanceIds=[
                 instance_id,
             ]
@@ -253,16 +520,114 @@ def main(argv):
         sys.exit('ERROR: {}'.format(e))
     
     """ Step 7: Clean up """
-    print('---Clean up resources')
+    report(instance_id, '---Clean up resources')
     for cleanup in volume_data:
-        print('---Remove snapshot {}'.format(cleanup['snapshot'].id))
-        cleanup['snapshot'].delete()
-        print('---Remove encrypted snapshot {}'.format(cleanup['snapshot_encrypted'].id))
-        cleanup['snapshot_encrypted'].delete()
-        print('---Remove original volume {}'.format(cleanup['volume'].id))
-        cleanup['volume'].delete()
-    
-    print('Encryption finished')
+        report(instance_id, '---Remove snapshot {}'
+               .format(cleanup['snapshot_id']))
+        report(instance_id, '---Remove original volume {}'
+               .format(cleanup['volume_id']))
+    for snapshot_id in warmup_snapshot_ids:
+        report(instance_id, '---Remove warm-up snapshot {}'
+               .format(snapshot_id))
+    delete_concurrently(
+        client, instance_id,
+        snapshot_ids=[
+            cleanup['snapshot_id'] for cleanup in volume_data
+        ] + warmup_snapshot_ids,
+        volume_ids=[cleanup['volume_id'] for cleanup in volume_data],
+    )
+
+    report(instance_id, 'Encryption finished')
+    return {
+        bdm['volume_id']: bdm['volume_encrypted_id'] for bdm in volume_data
+    }
+
+
+def read_instance_ids(instances):
+    """ Split a comma separated list, or a file of ids, into instance ids """
+    if os.path.isfile(instances):
+        with open(instances) as instance_file:
+            instances = instance_file.read().replace('\n', ',')
+    return [i.strip() for i in instances.split(',') if i.strip()]
+
+
+def positive_int(value):
+    """ argparse type for counts that must be at least 1 """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            '{} is not a positive integer'.format(value))
+    return number
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Encrypts EC2 root volume.')
+    instance_group = parser.add_mutually_exclusive_group(required=True)
+    instance_group.add_argument('-i', '--instance',
+                                help='Instance to encrypt volume on.')
+    instance_group.add_argument('--instances',
+                                help='Comma separated instance ids, or a '
+                                     'file with one id per line.')
+    parser.add_argument('-key', '--customer_master_key',
+                        help='Customer master key (key id, key ARN, alias '
+                             'name or alias ARN)', required=False)
+    parser.add_argument('-p', '--profile',
+                        help='Profile to use', required=False)
+    parser.add_argument('-r', '--region',
+                        help='Region of source volume (defaults to the '
+                             'profile\'s region)', required=False)
+    parser.add_argument('-w', '--workers', type=positive_int, default=5,
+                        help='Instances to encrypt in parallel', required=False)
+    args = parser.parse_args()
+
+    """ Set up AWS Client """
+    if args.profile:
+        # Use custom session
+        print('Using profile {}'.format(args.profile))
+
+    try:
+        client = _get_client(args.profile, args.region)
+    except botocore.exceptions.NoRegionError:
+        sys.exit('ERROR: No region configured, pass one with --region')
+    print('Using region {}'.format(client.meta.region_name))
+
+    # Get CMK, resolving aliases so it matches volumes' KmsKeyId
+    customer_master_key = None
+    if args.customer_master_key:
+        customer_master_key = resolve_key_arn(
+            _get_client(args.profile, args.region, 'kms'),
+            args.customer_master_key,
+        )
+
+    if args.instance:
+        encrypt_instance(client, args.instance, customer_master_key)
+        return
+
+    instance_ids = read_instance_ids(args.instances)
+    failures = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            (instance_id, executor.submit(
+                encrypt_instance, client, instance_id, customer_master_key))
+            for instance_id in instance_ids
+        ]
+
+    for instance_id, future in futures:
+        try:
+            future.result()
+        except (SystemExit, botocore.exceptions.ClientError) as e:
+            report(instance_id, '---Instance failed: {}'.format(e))
+            failures.append(instance_id)
+
+    if failures:
+        sys.exit(
+            'ERROR: {} of {} instances failed: {}'
+            .format(len(failures), len(instance_ids), ', '.join(failures))
+        )
+
 
 if __name__ == "__main__":
     main(sys.argv[1:])